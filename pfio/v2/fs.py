@@ -15,6 +15,9 @@ from deprecation import deprecated
 from pfio.v2 import config
 from pfio.version import __version__  # NOQA
 
+# Looked up on every operation by ``FS._checkfork``
+_getpid = os.getpid
+
 
 class FileStat(abc.ABC):
     """Detailed file or directory information abstraction
@@ -139,12 +142,15 @@ class FS(abc.ABC):
         return fs
 
     def _checkfork(self):
-        if not self.is_forked:
+        # Called on every operation; compare pids without going
+        # through ``is_forked``
+        pid = _getpid()
+        if self.pid == pid:
             return
 
         # Forked!
         self._reset()
-        self.pid = os.getpid()
+        self.pid = pid
 
     @abstractmethod
     def _reset(self):
@@ -474,3 +480,10 @@ def lazify(init_func, lazy_init=True, recreate_on_fork=True):
 def format_repr(cls: Type, data: Dict[str, Any]) -> str:
     data_str = ", ".join(f"{name}={value!r}" for name, value in data.items())
     return f"{cls.__module__}.{cls.__name__}({data_str})"
+
+
+def _is_plain_path(path: str) -> bool:
+    # True if os.path.normpath doesn't change the relative path: no
+    # empty or dot segments and no leading or trailing slash
+    return bool(path) and path[0] not in '/.' and path[-1] != '/' \
+        and '//' not in path and '/.' not in path
@@ -1,21 +1,77 @@
 import base64
+import collections
+import concurrent.futures
 import hashlib
 import io
+import operator
 import os
+import threading
+import time
 import urllib.parse
 from types import TracebackType
-from typing import Optional, Type
+from typing import Any, Dict, Optional, Tuple, Type
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from pfio._profiler import record, record_iterable
 
-from .fs import FS, FileStat, format_repr
+from .fs import FS, FileStat, _is_plain_path, format_repr
 
 DEFAULT_MAX_BUFFER_SIZE = 16 * 1024 * 1024
 
+# A part must be more than 8 MiB in S3 (except the last one)
+MPU_MIN_CHUNKSIZE = 8 * 1024 * 1024
+MPU_MAX_CHUNKSIZE = 5 * 1024 * 1024 * 1024
+# Part size the writer converges to when the object size is unknown
+MPU_MAX_AUTO_CHUNKSIZE = 64 * 1024 * 1024
+MPU_CHUNK_ALIGNMENT = 16 * 1024 * 1024
+# Max number of parts being uploaded at once by a writer
+MPU_CONCURRENCY = 4
+
+# Reads of two ranges or more are split and fetched concurrently
+PARALLEL_READ_CHUNKSIZE = 16 * 1024 * 1024
+PARALLEL_READ_CONCURRENCY = 8
+
+# Max number of ``head_object`` responses kept per S3 instance
+HEAD_CACHE_SIZE = 1024
+
+_get_key = operator.itemgetter('Key')
+_get_prefix = operator.itemgetter('Prefix')
+
+# Set ``PFIO_S3_DEBUG`` to dump boto3 debug logs; installed only once
+_debug_logger_installed = False
+
+# boto3 clients shared among S3 instances with the same settings;
+# clients are thread-safe but not fork-safe
+_clients: Dict[Tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _reset_clients():
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_clients)
+
+
+def _client_for(kwargs, botocore_config):
+    key = (tuple(sorted(kwargs.items())),
+           tuple(sorted((k, tuple(sorted(v.items())))
+                        if isinstance(v, dict) else (k, v)
+                        for k, v in botocore_config.items())))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            config = Config(**botocore_config)
+            client = boto3.client('s3', config=config, **kwargs)
+            _clients[key] = client
+        return client
+
 
 class S3ProfileIOWrapper:
     def __init__(self, obj):
@@ -55,7 +111,40 @@ class Boto3ProfileWrapper:
             return attr
 
 
+def _mpu_chunksize_for(expected_size: int) -> int:
+    # Aim at less than 1000 parts, far below the limit of 10,000 parts.
+    size = max(MPU_MIN_CHUNKSIZE,
+               min(MPU_MAX_CHUNKSIZE, expected_size // 1000))
+    size = -(-size // MPU_CHUNK_ALIGNMENT) * MPU_CHUNK_ALIGNMENT
+    return min(size, MPU_MAX_CHUNKSIZE)
+
+
+def _prefetch_pages(pages):
+    # Fetch the next page in background while the caller consumes the
+    # current one, so that listing round trips overlap with the work
+    pages = iter(pages)
+    end = object()
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    try:
+        future = executor.submit(next, pages, end)
+        while True:
+            page = future.result()
+            if page is end:
+                return
+            future = executor.submit(next, pages, end)
+            yield page
+    finally:
+        # Don't wait for the in-flight request; the worker exits after
+        # it finishes
+        executor.shutdown(wait=False)
+
+
 def _normalize_key(key: str) -> str:
+    if _is_plain_path(key):
+        return key
+    elif key[:1] == '/' and _is_plain_path(key[1:]):
+        return key[1:]
+
     key = os.path.normpath(key)
     if key.startswith("/"):
         return key[1:]
@@ -63,6 +152,13 @@ def _normalize_key(key: str) -> str:
         return key
 
 
+def _key_prefix(cwd: str) -> str:
+    prefix = _normalize_key(cwd)
+    if prefix in ('', '.'):
+        return ''
+    return prefix + '/'
+
+
 class S3ObjectStat(FileStat):
     def __init__(self, key, head):
         self.filename = key
@@ -86,14 +182,16 @@ class S3PrefixStat(FileStat):
 
 
 class _ObjectReader(io.RawIOBase):
-    def __init__(self, client, bucket, key, mode, kwargs):
+    def __init__(self, client, bucket, key, mode, kwargs, head=None):
         super(_ObjectReader, self).__init__()
 
         self.client = client
         self.bucket = bucket
         self.key = key
 
-        res = self.client.head_object(Bucket=bucket, Key=key)
+        if head is None:
+            head = self.client.head_object(Bucket=bucket, Key=key)
+        res = head
         if res.get('DeleteMarker'):
             raise FileNotFoundError()
 
@@ -102,38 +200,141 @@ class _ObjectReader(io.RawIOBase):
         self.content_length = res['ContentLength']
         self._closed = False
 
-    def read(self, size=-1) -> bytes:
-        # Always returns binary; as this object is wrapped with
-        # TextIOWrapper in case of text mode open.
+        # Sequential readers may prefetch the next range in background
+        self._prefetch = kwargs.get('prefetch', False)
+        self._executor = None
+        self._next = None
 
-        s = self.pos
+    def _read_range(self, start, size):
+        return self._get_range(start, size).read()
 
-        if self.pos >= self.content_length:
-            return b''
-        elif size <= 0:
-            e = ''
+    def _get_range(self, start, size):
+        if size < 0:
+            r = 'bytes={}-'.format(start)
         else:
-            e = min(self.pos + size, self.content_length)
+            end = min(start + size, self.content_length) - 1
+            r = 'bytes={}-{}'.format(start, end)
 
-        r = 'bytes={}-{}'.format(s, e)
         res = self.client.get_object(Bucket=self.bucket,
                                      Key=self.key,
                                      Range=r)
-        body = res['Body']
-
-        if size < 0:
+        return res['Body']
+
+    def _read(self, size):
+        rest = self.content_length - self.pos
+        if size < 0 or size > rest:
+            size = rest
+        if size < 2 * PARALLEL_READ_CHUNKSIZE:
+            return self._read_range(self.pos, size)
+
+        buf = bytearray(size)
+        with memoryview(buf) as view:
+            n = self._read_ranges_into(view, self.pos)
+        if n < size:
+            return bytes(buf[:n])
+        return bytes(buf)
+
+    def _read_range_into(self, view, start):
+        # Read the response body directly into the buffer
+        body = self._get_range(start, len(view))
+        if not hasattr(body, 'readinto'):
+            # Old botocore has no StreamingBody.readinto
             data = body.read()
-        else:
-            data = body.read(size)
+            view[:len(data)] = data
+            return len(data)
+
+        n = 0
+        while n < len(view):
+            count = body.readinto(view[n:])
+            if not count:
+                break
+            n += count
+        return n
+
+    def _read_ranges_into(self, view, start):
+        size = len(view)
+        if size < 2 * PARALLEL_READ_CHUNKSIZE:
+            return self._read_range_into(view, start)
+
+        chunk = PARALLEL_READ_CHUNKSIZE
+        offsets = range(0, size, chunk)
+        workers = min(PARALLEL_READ_CONCURRENCY, len(offsets))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            counts = list(executor.map(
+                lambda off: self._read_range_into(view[off:off + chunk],
+                                                  start + off),
+                offsets))
+
+        # Stop at a short range, in case the object got truncated
+        n = 0
+        for off, count in zip(offsets, counts):
+            n = off + count
+            if count < min(chunk, size - off):
+                break
+        return n
+
+    def _take_prefetched(self, size):
+        if self._next is None:
+            return None
+
+        start, future = self._next
+        self._next = None
+        if start != self.pos:
+            future.cancel()
+            return None
+
+        data = future.result()
+        if 0 < size < len(data):
+            # Keep the rest for the next read
+            rest = concurrent.futures.Future()
+            rest.set_result(data[size:])
+            self._next = (start + size, rest)
+            data = data[:size]
+        return data
+
+    def _submit_prefetch(self, size):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        future = self._executor.submit(self._read_range, self.pos, size)
+        self._next = (self.pos, future)
+
+    def read(self, size=-1) -> bytes:
+        # Always returns binary; as this object is wrapped with
+        # TextIOWrapper in case of text mode open.
+
+        if self.pos >= self.content_length:
+            return b''
+        elif size == 0:
+            return b''
+
+        data = self._take_prefetched(size)
+        if data is None:
+            data = self._read(size)
+        elif size < 0 or len(data) < size:
+            # Prefetched range is shorter than requested; read the rest
+            end = self.pos + len(data)
+            if end < self.content_length:
+                rest = -1 if size < 0 else size - len(data)
+                data += self._read_range(end, rest)
 
         self.pos += len(data)
 
+        if self._prefetch and self._next is None and size > 0 \
+                and self.pos < self.content_length:
+            self._submit_prefetch(size)
+
         return data
 
     def readline(self):
         raise NotImplementedError()
 
     def close(self):
+        if self._next is not None:
+            self._next[1].cancel()
+            self._next = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         self._closed = True
 
     def __enter__(self):
@@ -179,6 +380,10 @@ class _ObjectReader(io.RawIOBase):
 
         if pos < 0:
             raise OSError(22, "[Errno 22] Invalid argument")
+        if self._next is not None and self._next[0] != pos:
+            # Drop the prefetched range on non-contiguous seek
+            self._next[1].cancel()
+            self._next = None
         self.pos = pos
         return self.pos
 
@@ -192,36 +397,57 @@ class _ObjectReader(io.RawIOBase):
         return self.read(-1)
 
     def readinto(self, b):
-        buf = self.read(len(b))
-        b[:len(buf)] = buf
-        return len(buf)
+        size = min(len(b), self.content_length - self.pos)
+        if self._prefetch or size <= 0:
+            # Prefetched ranges are kept as bytes
+            buf = self.read(len(b))
+            b[:len(buf)] = buf
+            return len(buf)
+
+        with memoryview(b) as view:
+            n = self._read_ranges_into(view.cast('B')[:size], self.pos)
+        self.pos += n
+        return n
 
 
 class _ObjectWriter:
-    def __init__(self, client, bucket, key, mode, mpu_chunksize, kwargs):
+    def __init__(self, client, bucket, key, mode, mpu_chunksize,
+                 upload_cutoff, kwargs, head_cache=None):
         self.client = client
         self.bucket = bucket
         self.key = key
         self.mode = mode
-        self._init_buf()
-        self.mpu_chunksize = mpu_chunksize
+        self.head_cache = head_cache
+        # Text is encoded on write, as ``put_object`` would do
+        self.buf = bytearray()
+        self.upload_cutoff = upload_cutoff
+
+        expected_size = kwargs.get('expected_size')
+        if expected_size is not None:
+            self.mpu_chunksize = _mpu_chunksize_for(expected_size)
+            self._max_chunksize = self.mpu_chunksize
+        else:
+            # Size unknown; start small and grow the part size as
+            # more parts are submitted.
+            self.mpu_chunksize = mpu_chunksize
+            self._max_chunksize = max(mpu_chunksize, MPU_MAX_AUTO_CHUNKSIZE)
         self.mpu_id = None
+        # Futures of uploaded parts, in the order of part numbers
         self.parts = []
-
-    def _init_buf(self):
-        if 'b' in self.mode:
-            self.buf = io.BytesIO()
-        else:
-            self.buf = io.StringIO()
+        self._executor = None
+        self._inflight = collections.deque()
 
     def flush(self):
-        # A part must be more than 8 MiB in S3
-        if len(self.buf.getvalue()) < 8 * 1024 * 1024:
-            return
-        self._flush()
+        # Flushing does not send data to S3 any more; parts are sent
+        # in ``write()`` as soon as the buffer reaches the part size,
+        # and the rest at ``close()``.
+        pass
 
-    def _flush(self):
-        # Send buffer as a part
+    def _part_size(self):
+        return max(self.mpu_chunksize, MPU_MIN_CHUNKSIZE)
+
+    def _flush(self, size):
+        # Send the head of buffer as a part
         c = self.client
         b = self.bucket
         k = self.key
@@ -229,78 +455,80 @@ class _ObjectWriter:
         if self.mpu_id is None:
             res = c.create_multipart_upload(Bucket=b, Key=k)
             self.mpu_id = res['UploadId']
-            boto3.set_stream_logger()
 
         assert self.mpu_id is not None
 
-        data = self.buf.getvalue()
-        if 'b' in self.mode:
-            md5 = base64.b64encode(
-                hashlib.md5(data).digest()
-            ).decode()
-        else:
-            md5 = base64.b64encode(
-                hashlib.md5(data.encode()).digest()
-            ).decode()
+        # A single copy of the part; botocore takes bytearray as is
+        data = self.buf[:size]
+        del self.buf[:size]
         num = len(self.parts) + 1
 
-        res = c.upload_part(Body=data, Bucket=b, Key=k,
-                            PartNumber=num,
-                            UploadId=self.mpu_id,
-                            ContentLength=len(data),
-                            ContentMD5=md5)
-        self.parts.append({'ETag': res['ETag'], 'PartNumber': num})
-
-        self._init_buf()
+        # Upload parts in background while the caller writes the next
+        # ones; wait for the oldest to bound memory usage
+        while len(self._inflight) >= MPU_CONCURRENCY:
+            self._inflight.popleft().result()
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                MPU_CONCURRENCY)
+        future = self._executor.submit(self._upload_part, num, data)
+        self.parts.append(future)
+        self._inflight.append(future)
+
+        self.mpu_chunksize = min(self.mpu_chunksize * 2, self._max_chunksize)
+
+    def _upload_part(self, num, data):
+        md5 = base64.b64encode(
+            hashlib.md5(data).digest()
+        ).decode()
+        res = self.client.upload_part(Body=data, Bucket=self.bucket,
+                                      Key=self.key, PartNumber=num,
+                                      UploadId=self.mpu_id,
+                                      ContentMD5=md5)
+        return {'ETag': res['ETag'], 'PartNumber': num}
 
     def write(self, buf):
-        written = 0
-        overflow = len(self.buf.getvalue()) + len(buf) - self.mpu_chunksize
-        if overflow > 0:
-            l = len(buf) - overflow
-            written += self.buf.write(buf[:l])
-            self.flush()
-            buf = buf[l:]
+        if 'b' in self.mode:
+            self.buf += buf
+        else:
+            self.buf += buf.encode()
 
-        written += self.buf.write(buf)
-        if len(self.buf.getvalue()) >= self.mpu_chunksize:
-            self.flush()
+        if self.mpu_id is None and len(self.buf) <= self.upload_cutoff:
+            # Small enough to be sent by a single ``put_object``
+            return len(buf)
 
-        return written
+        # Keep at least a minimum part in the buffer; the tail is sent
+        # together with it as the last part at close, rather than as a
+        # separate small (or empty) part.
+        while len(self.buf) >= self._part_size() + MPU_MIN_CHUNKSIZE:
+            self._flush(self._part_size())
+
+        return len(buf)
 
     def close(self):
         # See:  https://boto3.amazonaws.com/v1/documentation/
         # api/latest/reference/services/s3.html#S3.Client.put_object
-        if len(self.parts) == 0:
-            self.client.put_object(Body=self.buf.getvalue(),
+        if self.mpu_id is None:
+            self.client.put_object(Body=self.buf,
                                    Bucket=self.bucket,
                                    Key=self.key)
         else:
-            self._flush()
-            # DO: MPU
-            c = self.client
-            max_parts = len(self.parts) + 1
-            res = c.list_parts(Bucket=self.bucket,
-                               Key=self.key,
-                               UploadId=self.mpu_id, MaxParts=max_parts)
-
-            if res['IsTruncated']:
-                next_part = res['NextPartNumberMarker']
-                raise RuntimeError('Unexpectedly truncated: ' +
-                                   'next={}/maxparts={}'.format(next_part,
-                                                                max_parts))
-
-            parts = [{'ETag': part['ETag'], 'PartNumber': part['PartNumber']}
-                     for part in res.get('Parts', [])]
-            parts = sorted(parts, key=lambda x: int(x['PartNumber']))
-            assert self.parts == parts
-
-            res = c.complete_multipart_upload(Bucket=self.bucket,
-                                              Key=self.key,
-                                              UploadId=self.mpu_id,
-                                              MultipartUpload={'Parts': parts})
+            try:
+                while len(self.buf) > MPU_MAX_CHUNKSIZE:
+                    self._flush(self._part_size())
+                self._flush(len(self.buf))
+                # Parts are known from upload_part responses; no need
+                # to ask S3 again with ``list_parts``
+                parts = [future.result() for future in self.parts]
+            finally:
+                self._executor.shutdown(wait=False)
+                self._inflight.clear()
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.mpu_id,
+                MultipartUpload={'Parts': parts})
             # logger.info("Upload done.", res['Location'])
 
+        if self.head_cache is not None:
+            self.head_cache.pop(self.key, None)
         self.buf = None
 
     def __enter__(self):
@@ -345,7 +573,45 @@ class S3(FS):
     whichever smaller.
     ``buffering=0`` disables buffering, and ``buffering>0`` forcibly sets the
     specified value as the buffer size in bytes.
+
+    The bucket is checked by ``head_bucket`` on connection only when
+    ``create_bucket`` or ``verify_bucket`` is set. Otherwise a missing
+    bucket is reported by the first operation on it.
     ``connect_timeout`` and ``read_timeout`` are passed as ``botocore.config``.
+    So is ``max_pool_connections`` (default 50), the number of HTTP
+    connections kept by the client for concurrent requests such as
+    multi-part uploads, large reads and ``exists_many()``. ``None``
+    leaves botocore's default of 10.
+    ``payload_signing=False`` stops botocore from computing SHA-256 of
+    request bodies for the signature, which costs a full pass over
+    every uploaded byte on plain HTTP endpoints. Over HTTPS botocore
+    already skips it for uploads with a checksum. Disable it only for
+    trusted endpoints; ``None`` (default) leaves botocore's behavior.
+
+    Objects up to ``upload_cutoff`` bytes are written by a single
+    ``put_object`` call at close. Larger objects are sent by
+    multi-part upload, starting with parts of ``mpu_chunksize`` bytes.
+    Unless ``expected_size`` is given to ``open()``, the part size
+    doubles after each part up to 64 MiB (or ``mpu_chunksize`` if
+    larger), so ``mpu_chunksize`` is the size of the first part only.
+
+    With ``head_cache_ttl`` set to a positive number of seconds,
+    metadata of objects fetched by ``stat()``, ``exists()`` and
+    ``open()`` is kept for that period, so that opening an object
+    right after checking it costs a single ``HEAD`` request. The cache
+    is disabled by default (``head_cache_ttl=0``), because changes
+    made by other processes or ``S3`` instances are not visible until
+    the entry expires: a removed object may still look existing, and
+    an object overwritten with different size is read with the cached
+    length, which truncates the data or fails with ``InvalidRange``.
+    Enable it only for objects that are not modified while being read.
+    Common prefixes found by ``isdir()`` or ``exists()`` are cached
+    the same way.
+
+    Setting the environment variable ``PFIO_S3_DEBUG`` to a non-empty
+    value makes boto3 log every request and response at DEBUG level
+    to stderr. This is meant for debugging and slows down all boto3
+    clients in the process.
     '''
 
     def __init__(self, bucket, prefix=None,
@@ -353,10 +619,15 @@ class S3(FS):
                  aws_access_key_id=None,
                  aws_secret_access_key=None,
                  mpu_chunksize=32*1024*1024,
+                 upload_cutoff=64*1024*1024,
                  buffering=-1,
                  create=False,
                  connect_timeout=None,
                  read_timeout=None,
+                 max_pool_connections=50,
+                 head_cache_ttl=0,
+                 verify_bucket=False,
+                 payload_signing=None,
                  _skip_connect=None,  # For test purpose
                  trace=False,
                  **_):
@@ -366,6 +637,7 @@ class S3(FS):
 
         self.bucket = bucket
         self.create_bucket = create_bucket
+        self.verify_bucket = verify_bucket
         if prefix is not None:
             self.cwd = prefix
         else:
@@ -375,12 +647,11 @@ class S3(FS):
         del create
 
         self.mpu_chunksize = mpu_chunksize
+        self.upload_cutoff = upload_cutoff
         self.buffering = buffering
 
-        # boto3.set_stream_logger()
-
-        # import botocore
-        # botocore.session.Session().set_debug_logger()
+        self.head_cache_ttl = head_cache_ttl
+        self._head_cache = collections.OrderedDict()
 
         kwargs = {}
 
@@ -400,6 +671,14 @@ class S3(FS):
             botocore_config['connect_timeout'] = int(connect_timeout)
         if read_timeout is not None:
             botocore_config['read_timeout'] = int(read_timeout)
+        self.max_pool_connections = max_pool_connections
+        if max_pool_connections is not None:
+            botocore_config['max_pool_connections'] = int(
+                max_pool_connections)
+        self.payload_signing = payload_signing
+        if payload_signing is not None:
+            botocore_config['s3'] = {
+                'payload_signing_enabled': bool(payload_signing)}
         self.botocore_config = botocore_config
 
         # We won't expect any enviroment variable for S3 endpoints
@@ -430,18 +709,44 @@ class S3(FS):
             self.hostname = "undefined"
             print("S3 endpoint is not defined")
 
+    @property
+    def cwd(self):
+        return self._cwd
+
+    @cwd.setter
+    def cwd(self, value):
+        self._cwd = value
+        self._cwd_prefix = _key_prefix(value)
+
+    def _fast_key(self, path):
+        # Plain relative paths don't change by normalization; skip
+        # ``os.path`` functions for them.
+        if _is_plain_path(path):
+            return self._cwd_prefix + path
+        return _normalize_key(os.path.join(self.cwd, path))
+
     def _reset(self):
+        # ``_newfs`` updates ``_cwd`` without the setter
+        self._cwd_prefix = _key_prefix(self._cwd)
         self._connect()
 
     def _connect(self):
-        # print('boto3.client options:', kwargs)
-        config = Config(**self.botocore_config)
-        obj = boto3.client('s3', config=config, **self.kwargs)
+        global _debug_logger_installed
+        if os.getenv('PFIO_S3_DEBUG') and not _debug_logger_installed:
+            # Logs every request and response of all boto3 clients
+            boto3.set_stream_logger()
+            _debug_logger_installed = True
+
+        obj = _client_for(self.kwargs, self.botocore_config)
         if self.trace:
             self.client = Boto3ProfileWrapper(obj)
         else:
             self.client = obj
 
+        # Skip a round trip unless the bucket must be checked
+        if not (self.create_bucket or self.verify_bucket):
+            return
+
         try:
             self.client.head_bucket(Bucket=self.bucket)
         except ClientError as e:
@@ -451,9 +756,71 @@ class S3(FS):
             else:
                 raise e
 
+    def _transfer_config(self):
+        # For managed transfers by boto3; parts are sized and aligned
+        # as in our own multi-part upload
+        return TransferConfig(
+            multipart_threshold=max(self.upload_cutoff, MPU_MIN_CHUNKSIZE),
+            multipart_chunksize=MPU_CHUNK_ALIGNMENT,
+            max_concurrency=min(10, self.max_pool_connections or 10),
+            io_chunksize=1024 * 1024)
+
+    def _cache_get(self, key):
+        if self.head_cache_ttl <= 0:
+            return None
+        entry = self._head_cache.get(key)
+        if entry is None:
+            return None
+        fetched, res = entry
+        if time.monotonic() - fetched >= self.head_cache_ttl:
+            self._head_cache.pop(key, None)
+            return None
+        try:
+            # Least recently used entries are evicted first
+            self._head_cache.move_to_end(key)
+        except KeyError:
+            pass
+        return res
+
+    def _cache_put(self, key, res):
+        if self.head_cache_ttl <= 0:
+            return
+        self._head_cache[key] = (time.monotonic(), res)
+        while len(self._head_cache) > HEAD_CACHE_SIZE:
+            try:
+                self._head_cache.popitem(last=False)
+            except KeyError:
+                break
+
+    def _head(self, key):
+        res = self._cache_get(key)
+        if res is None:
+            res = self.client.head_object(Bucket=self.bucket, Key=key)
+            self._cache_put(key, res)
+        return res
+
+    def _is_prefix(self, key):
+        # Keys never end with '/' after normalization, so a cached
+        # prefix probe doesn't collide with ``head_object`` responses
+        if self._cache_get(key + '/'):
+            return True
+
+        res = self.client.list_objects_v2(
+            Bucket=self.bucket,
+            Prefix=key,
+            Delimiter="/",
+            MaxKeys=1,
+        )
+        for common_prefix in res.get('CommonPrefixes', []):
+            if common_prefix['Prefix'] == key + "/":
+                self._cache_put(key + '/', True)
+                return True
+        return False
+
     def __getstate__(self):
         state = self.__dict__.copy()
         state['client'] = None
+        state['_head_cache'] = collections.OrderedDict()
         return state
 
     def __setstate__(self, state):
@@ -472,12 +839,25 @@ class S3(FS):
     def open(self, path, mode='r', **kwargs):
         '''Opens an object accessor for read or write
 
-        .. note:: Multi-part upload is not yet available.
-
         Arguments:
             path (str): relative path from basedir
 
             mode (str): open mode
+
+            expected_size (int): Expected size of the object in bytes
+                in write mode. When given, the part size of multi-part
+                upload is chosen from it. Otherwise the part size
+                starts from ``mpu_chunksize`` and grows up to 64 MiB
+                as more parts are uploaded.
+
+            buffering (int): In read mode, overrides ``buffering``
+                given to the constructor for this object. Smaller
+                buffers suit random access of small ranges.
+
+            prefetch (bool): In read mode, fetch the next range in
+                background while the current one is consumed. Useful
+                for sequential reads of large objects. Default is
+                ``False``.
         '''
         with record("pfio.v2.S3:open", trace=self.trace):
             self._checkfork()
@@ -488,22 +868,25 @@ class S3(FS):
                     'Read-write mode is not supported'
                 )
 
-            path = os.path.join(self.cwd, path)
-            path = _normalize_key(path)
+            path = self._fast_key(path)
             if 'r' in mode:
                 obj = _ObjectReader(self.client, self.bucket,
-                                    path, mode, kwargs)
+                                    path, mode, kwargs,
+                                    head=self._head(path))
 
-                bs = self.buffering
+                buffering = kwargs.get('buffering')
+                if buffering is None:
+                    buffering = self.buffering
+                bs = buffering
                 if bs < 0:
                     bs = min(obj.content_length, DEFAULT_MAX_BUFFER_SIZE)
 
                 if 'b' in mode:
-                    if self.buffering and bs != 0:
+                    if buffering and bs != 0:
                         obj = io.BufferedReader(obj, buffer_size=bs)
                 else:
                     obj = io.TextIOWrapper(obj)
-                    if self.buffering:
+                    if buffering:
                         # This is undocumented property; but resident at
                         # least since 2009 (the merge of io-c branch).
                         # We'll use it until the day of removal.
@@ -513,8 +896,10 @@ class S3(FS):
                         obj._CHUNK_SIZE = bs
 
             elif 'w' in mode:
+                self._head_cache.pop(path, None)
                 obj = _ObjectWriter(self.client, self.bucket, path, mode,
-                                    self.mpu_chunksize, kwargs)
+                                    self.mpu_chunksize, self.upload_cutoff,
+                                    kwargs, head_cache=self._head_cache)
                 if 'b' in mode:
                     obj = io.BufferedWriter(obj)
 
@@ -538,10 +923,21 @@ class S3(FS):
                                  trace=self.trace):
             yield e
 
-    def _list(self, prefix: Optional[str] = "", recursive=False, detail=False):
-        self._checkfork()
-        key = os.path.join(self.cwd, "" if prefix is None else prefix)
-        key = _normalize_key(key)
+    def list_batch(self, prefix: Optional[str] = "", recursive=False):
+        '''List all objects (and prefixes) in batches
+
+        Same as ``list()``, but yields a list of names per page of
+        ``ListObjectsV2`` response, at most 1000 each. It is cheaper
+        than ``list()`` for prefixes with a large number of objects.
+
+        '''
+        for e in record_iterable("pfio.v2.S3:list_batch",
+                                 self._list_batch(prefix, recursive),
+                                 trace=self.trace):
+            yield e
+
+    def _list_pages(self, prefix, recursive):
+        key = self._fast_key("" if prefix is None else prefix)
         if key == '.':
             key = ''
         elif key != '' and not key.endswith('/'):
@@ -559,18 +955,33 @@ class S3(FS):
             paging_args['Delimiter'] = '/'
 
         iterator = paginator.paginate(**paging_args)
-        for res in iterator:
-            # print(res)
-            for common_prefix in res.get('CommonPrefixes', []):
-                if detail:
-                    yield S3PrefixStat(common_prefix['Prefix'][len(key):])
-                else:
-                    yield common_prefix['Prefix'][len(key):]
-            for content in res.get('Contents', []):
-                if detail:
-                    yield S3ObjectStat(content['Key'][len(key):], content)
-                else:
-                    yield content['Key'][len(key):]
+        return key, _prefetch_pages(iterator)
+
+    def _list_batch(self, prefix, recursive):
+        self._checkfork()
+        key, pages = self._list_pages(prefix, recursive)
+        klen = len(key)
+        for res in pages:
+            batch = [name[klen:] for name in
+                     map(_get_prefix, res.get('CommonPrefixes') or ())]
+            batch.extend([name[klen:] for name in
+                          map(_get_key, res.get('Contents') or ())])
+            yield batch
+
+    def _list(self, prefix: Optional[str] = "", recursive=False, detail=False):
+        if not detail:
+            for batch in self._list_batch(prefix, recursive):
+                yield from batch
+            return
+
+        self._checkfork()
+        key, pages = self._list_pages(prefix, recursive)
+        klen = len(key)
+        for res in pages:
+            for common_prefix in res.get('CommonPrefixes') or ():
+                yield S3PrefixStat(common_prefix['Prefix'][klen:])
+            for content in res.get('Contents') or ():
+                yield S3ObjectStat(content['Key'][klen:], content)
 
     def stat(self, path):
         '''Imitate FileStat with S3 Object metadata
@@ -578,11 +989,9 @@ class S3(FS):
         '''
         with record("pfio.v2.S3:stat", trace=self.trace):
             self._checkfork()
-            key = os.path.join(self.cwd, path)
-            key = _normalize_key(key)
+            key = self._fast_key(path)
             try:
-                res = self.client.head_object(Bucket=self.bucket,
-                                              Key=key)
+                res = self._head(key)
                 if res.get('DeleteMarker'):
                     raise FileNotFoundError()
 
@@ -603,7 +1012,7 @@ class S3(FS):
         '''
         with record("pfio.v2.S3:isdir", trace=self.trace):
             self._checkfork()
-            key = _normalize_key(os.path.join(self.cwd, file_path))
+            key = self._fast_key(file_path)
             if key == '.':
                 key = ''
             elif key.endswith('/'):
@@ -616,16 +1025,7 @@ class S3(FS):
             if len(key) == 0:
                 return True
 
-            res = self.client.list_objects_v2(
-                Bucket=self.bucket,
-                Prefix=key,
-                Delimiter="/",
-                MaxKeys=1,
-            )
-            for common_prefix in res.get('CommonPrefixes', []):
-                if common_prefix['Prefix'] == key + "/":
-                    return True
-            return False
+            return self._is_prefix(key)
 
     def mkdir(self, file_path: str, mode=0o777, *args, dir_fd=None):
         '''Does nothing
@@ -657,10 +1057,8 @@ class S3(FS):
         with record("pfio.v2.S3:exists", trace=self.trace):
             self._checkfork()
             try:
-                key = os.path.join(self.cwd, file_path)
-                key = _normalize_key(key)
-                res = self.client.head_object(Bucket=self.bucket,
-                                              Key=key)
+                key = self._fast_key(file_path)
+                res = self._head(key)
                 return not res.get('DeleteMarker')
             except ClientError as e:
                 if e.response['Error']['Code'] == '404':
@@ -670,6 +1068,37 @@ class S3(FS):
                 else:
                     raise e
 
+    def exists_many(self, paths):
+        '''Returns the existence of objects for each path
+
+        Same as ``exists()`` for each path, but requests are sent
+        concurrently. Results are in the order of ``paths``.
+        '''
+        with record("pfio.v2.S3:exists_many", trace=self.trace):
+            return self._map_concurrently(self.exists, paths)
+
+    def stat_many(self, paths):
+        '''Returns stats of objects for each path
+
+        Same as ``stat()`` for each path, but requests are sent
+        concurrently. Results are in the order of ``paths``. It raises
+        FileNotFoundError when any of them doesn't exist.
+        '''
+        with record("pfio.v2.S3:stat_many", trace=self.trace):
+            return self._map_concurrently(self.stat, paths)
+
+    def _map_concurrently(self, func, paths):
+        self._checkfork()
+        paths = list(paths)
+        if len(paths) <= 1:
+            return [func(path) for path in paths]
+
+        # Use as many threads as connections in the client's pool
+        workers = self.max_pool_connections or 10
+        workers = min(workers, len(paths))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(func, paths))
+
     def rename(self, src, dst):
         '''Copies & removes the object
 
@@ -681,36 +1110,103 @@ class S3(FS):
             self._checkfork()
             source = {
                 'Bucket': self.bucket,
-                'Key': _normalize_key(os.path.join(self.cwd, src)),
+                'Key': self._fast_key(src),
             }
-            dst = os.path.join(self.cwd, dst)
-            dst = _normalize_key(dst)
+            dst = self._fast_key(dst)
+            self._head_cache.pop(dst, None)
             self.client.copy(Bucket=self.bucket,
                              CopySource=source,
-                             Key=dst)
+                             Key=dst,
+                             Config=self._transfer_config())
             return self.remove(src)
 
+    def upload_file(self, local_path: str, path: str):
+        '''Uploads a local file to the object
+
+        The file is read and sent in parallel parts by boto3's managed
+        transfer, without buffering the whole content in memory.
+        '''
+        with record("pfio.v2.S3:upload_file", trace=self.trace):
+            self._checkfork()
+            key = self._fast_key(path)
+            self._head_cache.pop(key, None)
+            self.client.upload_file(local_path, self.bucket, key,
+                                    Config=self._transfer_config())
+
+    def download_file(self, path: str, local_path: str):
+        '''Downloads the object to a local file
+
+        The object is fetched in parallel ranged requests by boto3's
+        managed transfer. It raises a FileNotFoundError when the
+        specified object doesn't exist.
+        '''
+        with record("pfio.v2.S3:download_file", trace=self.trace):
+            self._checkfork()
+            key = self._fast_key(path)
+            try:
+                self.client.download_file(self.bucket, key, local_path,
+                                          Config=self._transfer_config())
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    msg = "No such S3 object: '{}'".format(path)
+                    raise FileNotFoundError(msg) from e
+                raise
+
     def remove(self, file_path: str, recursive=False):
         '''Removes an object
 
         It raises a FileNotFoundError when the specified file doesn't exist.
+        With ``recursive=True``, all objects under the common prefix
+        are removed by ``delete_objects``, up to 1000 objects per
+        request.
         '''
         with record("pfio.v2.S3:remove", trace=self.trace):
-            if recursive:
-                raise io.UnsupportedOperation("Recursive delete not supported")
+            if recursive and self._remove_recursive(file_path):
+                return
 
             if not self.exists(file_path):
                 msg = "No such S3 object: '{}'".format(file_path)
                 raise FileNotFoundError(msg)
 
             self._checkfork()
-            key = os.path.join(self.cwd, file_path)
-            key = _normalize_key(key)
+            key = self._fast_key(file_path)
+            self._head_cache.pop(key, None)
             return self.client.delete_object(Bucket=self.bucket,
                                              Key=key)
 
+    def _remove_recursive(self, file_path):
+        self._checkfork()
+        _, pages = self._list_pages(file_path, True)
+        found = False
+        futures = []
+        workers = min(8, self.max_pool_connections or 10)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for res in pages:
+                keys = [content['Key'] for content in
+                        res.get('Contents') or ()]
+                if keys:
+                    found = True
+                    futures.append(
+                        executor.submit(self._delete_objects, keys))
+        for future in futures:
+            future.result()
+
+        # Keys under the prefix may be cached in many ways
+        self._head_cache.clear()
+        # Not a prefix; removes the object at the path, if any
+        return found
+
+    def _delete_objects(self, keys):
+        res = self.client.delete_objects(
+            Bucket=self.bucket,
+            Delete={'Objects': [{'Key': key} for key in keys],
+                    'Quiet': True})
+        errors = res.get('Errors')
+        if errors:
+            raise OSError('Failed to remove {} objects: {} {}'.format(
+                len(errors), errors[0].get('Key'), errors[0].get('Message')))
+
     def _canonical_name(self, file_path: str) -> str:
-        path = os.path.join(self.cwd, file_path)
-        norm_path = _normalize_key(path)
+        norm_path = self._fast_key(file_path)
 
         return f"s3://{self.hostname}/{self.bucket}/{norm_path}"
@@ -1,17 +1,85 @@
+import concurrent.futures
+import copy
+import errno
+import functools
 import io
 import logging
 import os
+import threading
 import zipfile
 from datetime import datetime
-from typing import Optional, Set
+from typing import Dict, Optional, Set, Tuple
 
 from pfio._profiler import record, record_iterable
 
-from .fs import FS, FileStat, format_repr
+from .fs import FS, FileStat, _is_plain_path, format_repr
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.StreamHandler())
 
+# Bytes read at once from the end of an archive on open, to cover the
+# end of central directory record, the Zip64 locator and usually the
+# central directory itself
+ZIP_TAIL_PREFETCH_SIZE = 1024 * 1024
+
+# Threads of ``Zip.read_many()``; decompressors release the GIL
+ZIP_READ_CONCURRENCY = 8
+
+
+class _TailPrefetchedFile:
+    '''Serves reads in the last bytes of ``fp`` from memory
+
+    Opening a ZipFile takes several small reads backwards from the end
+    of the file, each costing a request on object storages such as
+    S3. The tail is fetched by one read instead, until ``release()``.
+    '''
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.size = fp.seek(0, io.SEEK_END)
+        self.pos = 0
+        self.tail_start = max(0, self.size - ZIP_TAIL_PREFETCH_SIZE)
+        fp.seek(self.tail_start)
+        self.tail: Optional[bytes] = fp.read()
+
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+    def release(self):
+        self.tail = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self.pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        if pos < 0:
+            raise OSError(errno.EINVAL, "Invalid argument")
+        self.pos = pos
+        return pos
+
+    def read(self, size=-1):
+        if self.tail is not None and self.pos >= self.tail_start:
+            start = self.pos - self.tail_start
+            if size is None or size < 0:
+                data = self.tail[start:]
+            else:
+                data = self.tail[start:start + size]
+        else:
+            self.fp.seek(self.pos)
+            data = self.fp.read(size)
+        self.pos += len(data)
+        return data
+
 
 class ZipProfileIOWrapper:
     def __init__(self, fp):
@@ -36,6 +104,13 @@ class ZipProfileIOWrapper:
             return attr
 
 
+@functools.lru_cache(maxsize=1024)
+def _timestamp(date_time):
+    # Entries of an archive mostly share a few timestamps. ZIP stores
+    # local time, which calendar.timegm would misread as UTC.
+    return float(datetime(*date_time).timestamp())
+
+
 class ZipFileStat(FileStat):
     """Detailed information of a file in a Zip
 
@@ -60,17 +135,39 @@ class ZipFileStat(FileStat):
         CRC (int): ``ZipFile.CRC``.
     """
 
+    # Attributes read from ``ZipInfo`` on access, as listing with
+    # ``detail=True`` creates a stat for every entry
+    _zip_info_attrs = frozenset((
+        'orig_filename', 'comment', 'create_system', 'create_version',
+        'extract_version', 'flag_bits', 'volume', 'internal_attr',
+        'external_attr', 'CRC', 'header_offset', 'compress_size',
+        'compress_type'))
+
     def __init__(self, zip_info):
-        self.last_modified = float(datetime(*zip_info.date_time).timestamp())
+        self._zip_info = zip_info
+
+    @property
+    def filename(self):
+        return self._zip_info.filename
+
+    @property
+    def last_modified(self):
+        return _timestamp(self._zip_info.date_time)
+
+    @property
+    def mode(self):
         # https://github.com/python/cpython/blob/3.8/Lib/zipfile.py#L392
-        self.mode = zip_info.external_attr >> 16
-        self.size = zip_info.file_size
+        return self._zip_info.external_attr >> 16
 
-        for k in ('filename', 'orig_filename', 'comment', 'create_system',
-                  'create_version', 'extract_version', 'flag_bits',
-                  'volume', 'internal_attr', 'external_attr', 'CRC',
-                  'header_offset', 'compress_size', 'compress_type'):
-            setattr(self, k, getattr(zip_info, k))
+    @property
+    def size(self):
+        return self._zip_info.file_size
+
+    def __getattr__(self, name):
+        if name in ZipFileStat._zip_info_attrs:
+            return getattr(self._zip_info, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
 
 
 class Zip(FS):
@@ -101,6 +198,10 @@ class Zip(FS):
         self._reset()
 
     def _reset(self):
+        # A forked child inherits the parsed central directory; only
+        # the file needs to be opened again
+        parsed = getattr(self, 'zipobj', None) if self._readonly else None
+
         with record("pfio.v2.Zip:create-zipfile-obj", trace=self.trace):
             obj = self.backend.open(self.file_path,
                                     self.mode + 'b',
@@ -108,17 +209,31 @@ class Zip(FS):
             self.fileobj = obj
 
             assert self.fileobj is not None
-            self.zipobj = zipfile.ZipFile(self.fileobj, self.mode)
+            if parsed is not None:
+                self.zipobj = _copy_zipfile(parsed, obj)
+                return
+            elif self._readonly:
+                fp = _TailPrefetchedFile(obj)
+                self.zipobj = zipfile.ZipFile(fp, self.mode)
+                fp.release()
+            else:
+                self.zipobj = zipfile.ZipFile(self.fileobj, self.mode)
 
         self.name_cache: Optional[Set[str]] = None
+        self.dir_cache: Optional[Set[str]] = None
+        self.children_cache: Optional[
+            Dict[Tuple[str, ...], Dict[str, zipfile.ZipInfo]]] = None
         if self._readonly:
             self.name_cache = self._names()
+            self.dir_cache = self._dirs()
 
     def __getstate__(self):
         state = self.__dict__.copy()
         state['fileobj'] = None
         state['zipobj'] = None
         state['name_cache'] = None
+        state['dir_cache'] = None
+        state['children_cache'] = None
         return state
 
     def __setstate__(self, state):
@@ -140,7 +255,7 @@ class Zip(FS):
         with record("pfio.v2.Zip:open", trace=self.trace):
             self._checkfork()
 
-            file_path = os.path.join(self.cwd, os.path.normpath(file_path))
+            file_path = self._abspath(file_path)
             fp = self.zipobj.open(file_path, mode.replace('b', ''))
 
             if 'b' not in mode:
@@ -151,6 +266,27 @@ class Zip(FS):
             else:
                 return fp
 
+    def read_many(self, paths):
+        '''Reads whole contents of entries for each path
+
+        Entries are read and decompressed concurrently by threads, as
+        zlib and other decompressors release the GIL. Results are in
+        the order of ``paths``.
+        '''
+        with record("pfio.v2.Zip:read_many", trace=self.trace):
+            self._checkfork()
+            paths = list(paths)
+            if len(paths) <= 1:
+                return [self._read_entry(path) for path in paths]
+
+            workers = min(ZIP_READ_CONCURRENCY, len(paths))
+            with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+                return list(executor.map(self._read_entry, paths))
+
+    def _read_entry(self, path):
+        with self.zipobj.open(self._abspath(path)) as fp:
+            return fp.read()
+
     def subfs(self, path):
         # TODO
         raise NotImplementedError()
@@ -165,7 +301,7 @@ class Zip(FS):
         with record("pfio.v2.Zip:stat", trace=self.trace):
             self._checkfork()
             names = self._names()
-            path = os.path.join(self.cwd, os.path.normpath(path))
+            path = self._abspath(path)
             if path in names:
                 actual_path = path
             elif not path.endswith('/') and path + '/' in names:
@@ -193,8 +329,7 @@ class Zip(FS):
         self._checkfork()
 
         if path_or_prefix:
-            path_or_prefix = os.path.join(self.cwd,
-                                          os.path.normpath(path_or_prefix))
+            path_or_prefix = self._abspath(path_or_prefix)
             # cannot move beyond root
             given_dir_list = path_or_prefix.split('/')
             if ("." in given_dir_list or ".." in given_dir_list
@@ -208,48 +343,33 @@ class Zip(FS):
             if self.exists(path_or_prefix) and not self.isdir(path_or_prefix):
                 raise NotADirectoryError(
                     "{} is not a directory".format(path_or_prefix))
-            elif not any(name.startswith(path_or_prefix + "/")
-                         for name in self._names()):
+            elif path_or_prefix not in self._dirs():
                 # check if directories are NOT included in the zip
                 # such kind of zip can be made with "zip -D"
                 raise FileNotFoundError(
                     "{} is not found".format(path_or_prefix))
 
         if recursive:
+            assert path_or_prefix is not None
+            prefix_len = len(path_or_prefix)
             for info in self.zipobj.infolist():
                 name = info.filename
-                assert path_or_prefix is not None
-                if name.startswith(path_or_prefix):
-                    name = name[len(path_or_prefix):].strip("/")
-                    if name:
-                        if detail:
-                            yield ZipFileStat(info)
-                        else:
-                            yield name
-        else:
-            _list = set()
-            for info in self.zipobj.infolist():
-                name = info.filename
-                return_file_name = None
-                current_dir_list = os.path.normpath(name).split('/')
-                if not given_dir_list:
-                    # if path_or_prefix is not given
-                    return_file_name = current_dir_list[0]
-                else:
-                    if (current_dir_list
-                            and len(current_dir_list) > len(given_dir_list)
-                            and current_dir_list[:len(given_dir_list)] ==
-                            given_dir_list):
-                        return_file_name = current_dir_list[
-                            len(given_dir_list):][0]
-
-                if (return_file_name is not None
-                        and return_file_name not in _list):
-                    _list.add(return_file_name)
+                if not name.startswith(path_or_prefix):
+                    continue
+                # Slicing at 0 and stripping nothing return the same str
+                name = name[prefix_len:].strip("/")
+                if name:
                     if detail:
                         yield ZipFileStat(info)
                     else:
-                        yield return_file_name
+                        yield name
+        else:
+            children = self._children().get(tuple(given_dir_list), {})
+            for name, info in children.items():
+                if detail:
+                    yield ZipFileStat(info)
+                else:
+                    yield name
 
     def isdir(self, file_path: str):
         with record("pfio.v2.Zip:isdir", trace=self.trace):
@@ -258,13 +378,10 @@ class Zip(FS):
             if self.exists(file_path):
                 return self.stat(file_path).isdir()
             else:
-                file_path = os.path.normpath(file_path)
+                if not _is_plain_path(file_path):
+                    file_path = os.path.normpath(file_path)
                 # check if directories are NOT included in the zip
-                if any(name.startswith(file_path + "/")
-                       for name in self._names()):
-                    return True
-
-                return False
+                return file_path in self._dirs()
 
     def mkdir(self, file_path: str, mode=0o777, *args, dir_fd=None):
         raise io.UnsupportedOperation("zip does not support mkdir")
@@ -275,10 +392,10 @@ class Zip(FS):
     def exists(self, file_path: str):
         with record("pfio.v2.Zip:exists", trace=self.trace):
             self._checkfork()
-            file_path = os.path.join(self.cwd, os.path.normpath(file_path))
-            namelist = self.zipobj.namelist()
-            return (file_path in namelist
-                    or file_path + "/" in namelist)
+            file_path = self._abspath(file_path)
+            names = self._names()
+            return (file_path in names
+                    or file_path + "/" in names)
 
     def rename(self, *args):
         raise io.UnsupportedOperation
@@ -286,9 +403,17 @@ class Zip(FS):
     def remove(self, file_path, recursive=False):
         raise io.UnsupportedOperation
 
+    def _abspath(self, path: str) -> str:
+        # Skip os.path.normpath for paths it doesn't change
+        if not _is_plain_path(path):
+            path = os.path.normpath(path)
+        if self.cwd:
+            return os.path.join(self.cwd, path)
+        return path
+
     def _canonical_name(self, file_path: str) -> str:
         canonical_name = self.backend._canonical_name(self.file_path)
-        file_path = os.path.join(self.cwd, os.path.normpath(file_path))
+        file_path = self._abspath(file_path)
 
         # Use pfio-zipfs as reserved name to represent PFIO's Zip.
         # If someone use `pfio-zipfs` in file_path, this might be broken.
@@ -302,6 +427,52 @@ class Zip(FS):
                 data.filename for data in self.zipobj.infolist()
             )
 
+    def _children(self) -> Dict[Tuple[str, ...], Dict[str, zipfile.ZipInfo]]:
+        # Immediate children of each directory, keyed by its path
+        # components, with the first entry found under each child
+        if self.children_cache is None:
+            children: Dict[Tuple[str, ...], Dict[str, zipfile.ZipInfo]] = {}
+            for info in self.zipobj.infolist():
+                name = info.filename
+                if not _is_plain_path(name):
+                    name = os.path.normpath(name)
+                parts = name.split('/')
+                for depth in range(len(parts)):
+                    children.setdefault(tuple(parts[:depth]), {}) \
+                        .setdefault(parts[depth], info)
+            if not self._readonly:
+                return children
+            self.children_cache = children
+        return self.children_cache
+
+    def _dirs(self) -> Set[str]:
+        # Directories including those without their own entries, i.e.
+        # every ``path`` where some name starts with ``path + "/"``
+        if self.dir_cache is not None:
+            return self.dir_cache
+
+        dirs = set()
+        for name in self._names():
+            i = name.rfind('/')
+            while i >= 0:
+                path = name[:i]
+                if path in dirs:
+                    break
+                dirs.add(path)
+                i = name.rfind('/', 0, i)
+        return dirs
+
+
+def _copy_zipfile(zipobj: zipfile.ZipFile, fp) -> zipfile.ZipFile:
+    # ZipFile reading ``fp`` with the entries already parsed by
+    # ``zipobj``; the file-related state is set as ZipFile.__init__ does
+    new = copy.copy(zipobj)
+    new.fp = fp
+    new.filename = getattr(fp, 'name', None)
+    new._fileRefCnt = 1  # type: ignore
+    new._lock = threading.RLock()  # type: ignore
+    return new
+
 
 def _open_zip(fs, file_path, mode, **kwargs) -> Zip:
     return Zip(fs, file_path, mode, **kwargs)
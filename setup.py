@@ -9,12 +9,12 @@ package_data = []
 proj_dir = os.path.dirname(__file__)
 templates = os.path.join(proj_dir, 'resources', 'templates')
 
-for root, dirs, names in os.walk(templates):
-    for fname in names:
-        abspath = os.path.join(root, fname)
-        relpath = os.path.relpath(proj_dir, abspath)
-        package_data.append(relpath)
-        print(relpath)
+if os.path.isdir(templates):
+    for root, dirs, names in os.walk(templates):
+        for fname in names:
+            abspath = os.path.join(root, fname)
+            relpath = os.path.relpath(proj_dir, abspath)
+            package_data.append(relpath)
 
 here = os.path.abspath(os.path.dirname(__file__))
 # Get __version__ variable
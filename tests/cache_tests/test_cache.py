@@ -1,9 +1,11 @@
+import functools
 import hashlib
 import json
 import os
 import pickle
 import random
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 import numpy as np
@@ -12,6 +14,9 @@ import pytest
 from pfio.cache import FileCache, HTTPCache, MultiprocessFileCache, NaiveCache
 from pfio.testing import make_http_server
 
+# Seeded to make orders reproducible without touching the global RNG
+_rng = random.Random(0)
+
 
 @contextmanager
 def make_cache(test_class, mt_safe, do_pickle, length,
@@ -66,33 +71,33 @@ def make_cache(test_class, mt_safe, do_pickle, length,
 def test_cache(test_class, mt_safe, do_pickle, do_shuffle):
     length = l = 1024
 
+    # Serialized once; compared as bytes instead of loading them back
+    pickled = [pickle.dumps(j * 2) for j in range(length)]
+
     with make_cache(test_class, mt_safe, do_pickle, l) as cache:
         if not do_pickle:
             def getter(x):
-                return pickle.dumps(x * 2)
+                return pickled[x]
         else:
             def getter(x):
                 return x * 2
 
         if do_shuffle:
-            shuffled = list(random.sample(range(length), length)) * 2
+            p = np.random.default_rng(0).permutation(length)
+            shuffled = np.concatenate([p, p]).tolist()
         else:
             shuffled = list(range(length)) * 2
 
+        expected = pickled if not do_pickle else [j * 2 for j in range(l)]
+
         for i in shuffled:
             j = i % l
             data = cache.get_and_cache(j, getter)
-            if not do_pickle:
-                data = pickle.loads(data)
-            assert j * 2 == data
+            assert expected[j] == data
 
         for i in shuffled:
             j = i % l
-            data = cache.get(j)
-            assert data is not None
-            if not do_pickle:
-                data = pickle.loads(data)
-            assert j * 2 == data
+            assert expected[j] == cache.get(j)
 
 
 @pytest.mark.parametrize("test_class", [NaiveCache, FileCache,
@@ -109,7 +114,8 @@ def test_cache_numpy(test_class, mt_safe, do_shuffle):
         def getter(i):
             return arr_list[i]
         if do_shuffle:
-            shuffled = list(random.sample(range(length), length)) * 2
+            p = np.random.default_rng(0).permutation(length)
+            shuffled = np.concatenate([p, p]).tolist()
         else:
             shuffled = list(range(length)) * 2
 
@@ -125,53 +131,55 @@ def test_cache_numpy(test_class, mt_safe, do_shuffle):
             assert np.array_equal(arr_list[j], data)
 
 
-def _getbin(i):
-    m = hashlib.md5()
-    m.update(str(i).encode())
-    # blob = b''
-    digest = m.digest()
-    size = 1024 * 16
-    # 1024 * 16 = 16KB / 1024*1024 * 16 = 16MB
-    blob = [digest * size][0]
-    return blob
+# Digests for blobs of test_cache_blob, computed once at import
+_DIGESTS = [hashlib.blake2b(str(i).encode(), digest_size=16).digest()
+            for i in range(1000)]
+
+
+@functools.lru_cache(maxsize=None)
+def _getbin(i, size=4 * 1024):
+    # Shared by all parametrizations of test_cache_blob
+    # 16-byte digest repeated up to ``size`` bytes
+    return _DIGESTS[i] * (size // 16)
 
 
 @pytest.mark.parametrize("test_class", [NaiveCache, FileCache,
                                         MultiprocessFileCache,
                                         HTTPCache])
 @pytest.mark.parametrize("mt_safe", [True, False])
-@pytest.mark.parametrize("length", [
-    pytest.param(-1, marks=pytest.mark.xfail),
-    pytest.param(0, marks=pytest.mark.xfail),
-    1, 20, 100, 1000])
-def test_cache_blob(test_class, mt_safe, length):
+@pytest.mark.parametrize("length, blob_size", [
+    pytest.param(-1, 4 * 1024, marks=pytest.mark.xfail),
+    pytest.param(0, 4 * 1024, marks=pytest.mark.xfail),
+    (1, 4 * 1024), (20, 4 * 1024), (100, 4 * 1024), (1000, 4 * 1024),
+    # Large blobs, kept short to limit bytes written by the suite
+    (20, 256 * 1024)])
+def test_cache_blob(test_class, mt_safe, length, blob_size):
     l = length
 
+    bins = [_getbin(i, blob_size) for i in range(l)]
+
     with make_cache(test_class, mt_safe, False, l) as cache:
         for i in range(l):
-            data = cache.get_and_cache(i, _getbin)
-            assert _getbin(i) == data
+            data = cache.get_and_cache(i, bins.__getitem__)
+            assert bins[i] == data
 
         for i in range(l):
-            data = cache.get(i)
-            assert data is not None
-            assert _getbin(i) == data
+            assert bins[i] == cache.get(i)
 
         for i in range(l):
-            data = cache.get(i)
-            assert data is not None
-            assert _getbin(i) == data
+            assert bins[i] == cache.get(i)
 
 
 def test_index_range_naive():
     l = 10
+    payloads = [pickle.dumps(i * 2) for i in range(l)]
     with make_cache(NaiveCache, True, False, l) as cache:
         # Index check for Put
 
         cache.put(-1, pickle.dumps(9 ** 2))
 
         for i in range(l - 1):
-            cache.put(i, pickle.dumps(i * 2))
+            cache.put(i, payloads[i])
 
         with pytest.raises(IndexError):
             cache.put(l, pickle.dumps('too large'))
@@ -189,9 +197,10 @@ def test_index_range_naive():
                          [FileCache, MultiprocessFileCache, HTTPCache])
 def test_index_range_get(test_class):
     l = 10
+    payloads = [pickle.dumps(i * 2) for i in range(l)]
     with make_cache(test_class, True, False, l) as cache:
         for i in range(l):
-            cache.put(i, pickle.dumps(i * 2))
+            cache.put(i, payloads[i])
 
         with pytest.raises(IndexError):
             cache.get(-1)
@@ -227,7 +236,8 @@ def test_cache_limit_invalid_limits(test_class):
 
 
 @pytest.mark.parametrize("test_class", [FileCache, MultiprocessFileCache])
-def test_cache_limit_ok(test_class):
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_cache_limit_ok(test_class, concurrent):
     sample_size = 10
     l = 20
 
@@ -240,18 +250,26 @@ def test_cache_limit_ok(test_class):
         # To make sure the order of data to arrive
         # has nothing to do with the size limitation logic
         idxs = list(range(l))
-        random.shuffle(idxs)
+        _rng.shuffle(idxs)
 
         # It accepts the data until reaching to size limit
         data = b'x' * sample_size
-        for i in idxs[:10]:
+
+        def put_and_get(i):
             cache.put(i, data)
 
             # To make sure reading the data while putting data
             # doesn't interfere
-            j = random.randrange(l)
+            j = _rng.randrange(l)
             cache.get(j)
 
+        if concurrent:
+            with ThreadPoolExecutor(4) as executor:
+                list(executor.map(put_and_get, idxs[:10]))
+        else:
+            for i in idxs[:10]:
+                put_and_get(i)
+
         # More data cannot be accepted (though not error)
         for i in idxs[10:]:
             cache.put(i, data)
@@ -381,33 +399,22 @@ def test_preservation_overwrite(test_class):
 
 
 @pytest.mark.parametrize("test_class", [FileCache, MultiprocessFileCache])
-def test_enospc(test_class, monkeypatch):
-    def mock_pread(_fd, _buf, _offset):
-        ose = OSError(28, "No space left on device")
-        raise ose
-    with monkeypatch.context() as m:
-        m.setattr(os, 'pread', mock_pread)
-
-        with test_class(10) as cache:
-            i = 2
-            with pytest.warns(RuntimeWarning):
-                cache.put(i, str(i))
-
-
-@pytest.mark.parametrize("test_class", [FileCache, MultiprocessFileCache])
-def test_enoent(test_class, monkeypatch):
+@pytest.mark.parametrize("error, expectation", [
+    # ENOSPC only warns, the cache just stops accepting data
+    (OSError(28, "No space left on device"),
+     functools.partial(pytest.warns, RuntimeWarning)),
+    (OSError(2, "No such file or directory"),
+     functools.partial(pytest.raises, OSError)),
+], ids=["enospc", "enoent"])
+def test_pread_error(test_class, error, expectation, monkeypatch):
     def mock_pread(_fd, _buf, _offset):
-        ose = OSError(2, "No such file or directory")
-        raise ose
-
-    with monkeypatch.context() as m:
-        m.setattr(os, 'pread', mock_pread)
-
-        with test_class(10) as cache:
+        raise error
 
-            with pytest.raises(OSError):
+    monkeypatch.setattr(os, 'pread', mock_pread)
 
-                cache.put(4, str(4))
+    with test_class(10) as cache:
+        with expectation():
+            cache.put(2, str(2))
 
 
 @pytest.mark.parametrize("test_class", [FileCache, MultiprocessFileCache])
@@ -1,8 +1,8 @@
-import random
 import time
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
+import numpy as np
 import pytest
 
 from pfio.cache import FileCache, NaiveCache
@@ -19,13 +19,22 @@ def test_multithread(test_class):
         # assert data == _getbin(i)
         pass
 
+    def do_get_all(c, indices):
+        # One task per chunk, rather than per index, keeps the pool's
+        # work queue out of the measurement
+        for i in indices:
+            do_get(c, i)
+
+    def chunks(p):
+        indices = np.concatenate([p, p]).tolist()
+        return [indices[k::32] for k in range(32)]
+
     with test_class(length, multithread_safe=False) \
             as cache, ThreadPoolExecutor(max_workers=8) as pool:
+        rng = np.random.default_rng(0)
         b = time.time()
-        shuffled = list(random.sample(range(length), length)) * 2
-        pool.map(partial(do_get, cache), list(shuffled))
-        shuffled = list(random.sample(range(length), length)) * 2
-        pool.map(partial(do_get, cache), list(shuffled))
+        pool.map(partial(do_get_all, cache), chunks(rng.permutation(length)))
+        pool.map(partial(do_get_all, cache), chunks(rng.permutation(length)))
         e = time.time()
         print(e - b, "seconds to get and put", length, "entries.",
               length / (e - b), "ops/sec at", name)
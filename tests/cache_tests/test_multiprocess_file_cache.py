@@ -8,6 +8,10 @@ import pytest
 
 from pfio.cache import FileCache, MultiprocessFileCache
 
+# Children inherit the cache, its open file and the local functions
+# by fork, without pickling them
+mp_ctx = multiprocessing.get_context('fork')
+
 
 def test_pickable():
     with tempfile.TemporaryDirectory() as d:
@@ -40,7 +44,7 @@ def test_cleanup_subprocess():
 
     with tempfile.TemporaryDirectory() as d:
         cache = MultiprocessFileCache(10, dir=d, do_pickle=True)
-        p = multiprocessing.Process(target=child, args=(cache,))
+        p = mp_ctx.Process(target=child, args=(cache,))
         p.start()
         p.join()
 
@@ -64,9 +68,11 @@ def test_multiprocess_consistency():
     sample_size = 8192
 
     def child(cache, worker_idx):
+        # put pickles the sample right away, so one buffer can be reused
+        data = np.empty(sample_size, dtype=np.int32)
         for i in range(n_samples_per_worker):
             sample_idx = worker_idx * n_samples_per_worker + i
-            data = np.array([sample_idx] * sample_size, dtype=np.int32)
+            data.fill(sample_idx)
             cache.put(sample_idx, data)
 
     with tempfile.TemporaryDirectory() as d:
@@ -74,18 +80,23 @@ def test_multiprocess_consistency():
                                    dir=d, do_pickle=True) as cache:
 
             # Add tons of data into the cache in parallel
-            ps = [multiprocessing.Process(target=child, args=(cache, worker_idx))  # NOQA
+            ps = [mp_ctx.Process(target=child, args=(cache, worker_idx))
                   for worker_idx in range(n_workers)]
             for p in ps:
                 p.start()
             for p in ps:
                 p.join()
 
-            # Get each sample from the cache and check the content
-            for sample_idx in range(n_workers * n_samples_per_worker):
-                data = cache.get(sample_idx)
-                expected = np.array([sample_idx] * sample_size, dtype=np.int32)
-                assert (data == expected).all()
+            # Get each sample from the cache and check the content,
+            # one worker's worth of samples at a time
+            out = np.empty((n_samples_per_worker, sample_size), dtype=np.int32)
+            for worker_idx in range(n_workers):
+                start = worker_idx * n_samples_per_worker
+                for i in range(n_samples_per_worker):
+                    out[i] = cache.get(start + i)
+                expected = np.arange(start, start + n_samples_per_worker,
+                                     dtype=np.int32)
+                assert (out == expected[:, None]).all()
 
 
 def test_preservation_interoperability():
@@ -109,7 +120,7 @@ def test_preservation_interoperability():
 
 
 def test_preserve_error_subprocess():
-    pipe_recv, pipe_send = multiprocessing.Pipe(False)
+    pipe_recv, pipe_send = mp_ctx.Pipe(False)
 
     def child(c, pipe):
         try:
@@ -126,7 +137,7 @@ def test_preserve_error_subprocess():
             cache.put(i, str(i))
 
         # Run preservation in the subprocess
-        p = multiprocessing.Process(target=child, args=(cache, pipe_send))
+        p = mp_ctx.Process(target=child, args=(cache, pipe_send))
         p.start()
         p.join()
         cache.close()
@@ -145,7 +156,7 @@ def test_preload_error_not_found():
 
 
 def test_preload_error_subprocess():
-    pipe_recv, pipe_send = multiprocessing.Pipe(False)
+    pipe_recv, pipe_send = mp_ctx.Pipe(False)
 
     def child(c, pipe):
         try:
@@ -158,7 +169,7 @@ def test_preload_error_subprocess():
     with tempfile.TemporaryDirectory() as d:
         # Run preload in the subprocess
         cache = MultiprocessFileCache(10, dir=d, do_pickle=True)
-        p = multiprocessing.Process(target=child, args=(cache, pipe_send))
+        p = mp_ctx.Process(target=child, args=(cache, pipe_send))
         p.start()
         p.join()
         cache.close()
@@ -4,12 +4,15 @@ import multiprocessing as mp
 import os
 import pickle
 import tempfile
+import threading
 
 import pytest
+from botocore.exceptions import ClientError
 from moto import mock_aws
 
 from pfio.v2 import S3, from_url, open_url
-from pfio.v2.s3 import _ObjectReader
+from pfio.v2.s3 import (_mpu_chunksize_for, _normalize_key, _ObjectReader,
+                        _prefetch_pages)
 
 
 @pytest.fixture
@@ -49,6 +52,52 @@ def test_s3_init(s3_fixture):
         assert s3.endpoint is None
 
 
+def test_s3_shared_client(s3_fixture):
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3, \
+            from_url('s3://test-bucket/', **s3_fixture.aws_kwargs) as s3b:
+        assert s3.client is s3b.client
+        assert s3.client is s3.subfs('foo').client
+
+        with from_url('s3://test-bucket/base', read_timeout=30,
+                      **s3_fixture.aws_kwargs) as s3c:
+            assert s3.client is not s3c.client
+
+
+def test_s3_payload_signing(s3_fixture):
+    with from_url('s3://test-bucket/base', payload_signing=False,
+                  **s3_fixture.aws_kwargs) as s3:
+        s3_config = s3.client.meta.config.s3
+        assert s3_config['payload_signing_enabled'] is False
+
+        with s3.open('foo.data', 'wb') as f:
+            f.write(b'bar')
+        with s3.open('foo.data', 'rb') as f:
+            assert f.read() == b'bar'
+
+        with from_url('s3://test-bucket/base', payload_signing=False,
+                      **s3_fixture.aws_kwargs) as s3b:
+            assert s3.client is s3b.client
+        with from_url('s3://test-bucket/base',
+                      **s3_fixture.aws_kwargs) as s3c:
+            assert s3.client is not s3c.client
+
+
+def test_s3_verify_bucket(s3_fixture):
+    # No request is sent for the bucket until the first operation
+    with from_url('s3://no-such-bucket/base',
+                  **s3_fixture.aws_kwargs) as s3:
+        with pytest.raises(ClientError):
+            s3.open('foo.txt', 'r')
+
+    with pytest.raises(ClientError):
+        from_url('s3://no-such-bucket/base', verify_bucket=True,
+                 **s3_fixture.aws_kwargs)
+
+    with from_url('s3://test-bucket/base', verify_bucket=True,
+                  **s3_fixture.aws_kwargs) as s3:
+        assert s3.verify_bucket
+
+
 def test_s3_repr_str(s3_fixture):
     with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
         repr(s3)
@@ -92,6 +141,12 @@ def test_s3_init_with_timeouts(s3_fixture):
         assert isinstance(s3, S3)
         assert (s3.botocore_config['connect_timeout'] == 300)
         assert (s3.botocore_config['read_timeout'] == 120)
+        assert (s3.botocore_config['max_pool_connections'] == 50)
+        assert (s3.client.meta.config.max_pool_connections == 50)
+
+    with from_url('s3://test-bucket/base',
+                  max_pool_connections=None) as s3:
+        assert 'max_pool_connections' not in s3.botocore_config
 
 
 # TODO: Find out a way to know buffer size used in a BufferedReader
@@ -127,6 +182,27 @@ def test_s3_read(s3_fixture, buffering, reader_type):
             assert not fp.closed
 
 
+def test_s3_open_buffering(s3_fixture):
+    with from_url('s3://test-bucket/base',
+                  **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.txt', 'w') as fp:
+            fp.write('bar')
+
+        with s3.open('foo.txt', 'rb', buffering=0) as fp:
+            assert isinstance(fp, _ObjectReader)
+            assert b'bar' == fp.read()
+
+        with s3.open('foo.txt', 'rb', buffering=2) as fp:
+            assert isinstance(fp, io.BufferedReader)
+            assert b'bar' == fp.read()
+
+    with from_url('s3://test-bucket/base', buffering=0,
+                  **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.txt', 'rb', buffering=-1) as fp:
+            assert isinstance(fp, io.BufferedReader)
+            assert b'bar' == fp.read()
+
+
 def test_empty_file(s3_fixture):
     with from_url('s3://test-bucket/base',
                   **s3_fixture.aws_kwargs) as s3:
@@ -171,7 +247,7 @@ def test_s3_fork(s3_fixture):
 def test_s3_mpu(s3_fixture):
     # Test multipart upload
     with S3(s3_fixture.bucket, create_bucket=True, mpu_chunksize=8*1024*1024,
-            **s3_fixture.aws_kwargs) as s3:
+            upload_cutoff=0, **s3_fixture.aws_kwargs) as s3:
         with s3.open('testfile', 'wb') as fp:
             for _ in range(4):
                 fp.write(b"01234567" * (1024*1024))
@@ -203,6 +279,93 @@ def test_s3_mpu(s3_fixture):
         assert "0123456" == data[7:14]
 
 
+def test_s3_mpu_chunksize(s3_fixture):
+    MiB = 1024 * 1024
+    assert 16 * MiB == _mpu_chunksize_for(0)
+    assert 16 * MiB == _mpu_chunksize_for(1024 * MiB)
+    assert 112 * MiB == _mpu_chunksize_for(100 * 1024 * MiB)
+    assert 5 * 1024 * MiB == _mpu_chunksize_for(10 * 1024 * 1024 * MiB)
+
+    with S3(s3_fixture.bucket, create_bucket=True, mpu_chunksize=8 * MiB,
+            upload_cutoff=0, **s3_fixture.aws_kwargs) as s3:
+        with s3.open('testfile', 'wb',
+                     expected_size=100 * 1024 * MiB) as fp:
+            assert 112 * MiB == fp.raw.mpu_chunksize
+
+        # The part size grows as parts are uploaded
+        with s3.open('testfile', 'wb') as fp:
+            assert 8 * MiB == fp.raw.mpu_chunksize
+            fp.write(b"01234567" * (2 * MiB))
+            fp.flush()
+            assert 16 * MiB == fp.raw.mpu_chunksize
+            fp.write(b"01234567" * (2 * MiB))
+            fp.flush()
+            assert 32 * MiB == fp.raw.mpu_chunksize
+
+            # The tail is kept to be merged into the last part
+            assert 8 * MiB == len(fp.raw.buf)
+            fp.write(b"01234567" * (MiB // 2))
+            fp.flush()
+            assert 2 == len(fp.raw.parts)
+
+        with s3.open('testfile', 'rb') as fp:
+            data = fp.read()
+        assert 36 * MiB == len(data)
+        assert b"01234567" == data[-8:]
+
+
+def test_s3_mpu_concurrent(s3_fixture, monkeypatch):
+    MiB = 1024 * 1024
+    with S3(s3_fixture.bucket, create_bucket=True, mpu_chunksize=8 * MiB,
+            upload_cutoff=0, **s3_fixture.aws_kwargs) as s3:
+        chunks = [bytes([i]) * (3 * MiB) for i in range(24)]
+        with s3.open('testfile', 'wb') as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+            parts = fp.raw.parts
+        assert 1 < len(parts)
+        assert list(range(1, len(parts) + 1)) == \
+            [future.result()['PartNumber'] for future in parts]
+
+        with s3.open('testfile', 'rb') as fp:
+            assert b''.join(chunks) == fp.read()
+
+        # Errors in background uploads are raised in the caller
+        def failing_upload_part(**kwargs):
+            raise RuntimeError('upload_part')
+
+        monkeypatch.setattr(s3.client, 'upload_part', failing_upload_part)
+        with pytest.raises(RuntimeError):
+            with s3.open('testfile2', 'wb') as fp:
+                for chunk in chunks:
+                    fp.write(chunk)
+
+
+def test_s3_upload_cutoff(s3_fixture):
+    MiB = 1024 * 1024
+    with S3(s3_fixture.bucket, create_bucket=True, mpu_chunksize=8 * MiB,
+            upload_cutoff=12 * MiB, **s3_fixture.aws_kwargs) as s3:
+        with s3.open('small', 'wb') as fp:
+            fp.write(b"01234567" * (3 * MiB // 2))
+            fp.flush()
+            assert fp.raw.mpu_id is None
+
+        with s3.open('large', 'wb') as fp:
+            fp.write(b"01234567" * (3 * MiB // 2))
+            fp.flush()
+            assert fp.raw.mpu_id is None
+            fp.write(b"01234567" * MiB)
+            fp.flush()
+            assert fp.raw.mpu_id is not None
+            assert 1 == len(fp.raw.parts)
+
+        for name, size in [('small', 12 * MiB), ('large', 20 * MiB)]:
+            with s3.open(name, 'rb') as fp:
+                data = fp.read()
+            assert size == len(data)
+            assert b"01234567" == data[-8:]
+
+
 def test_s3_recursive(s3_fixture):
     with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
 
@@ -217,6 +380,55 @@ def test_s3_recursive(s3_fixture):
             assert p.startswith('base/')
 
 
+def test_s3_list_batch(s3_fixture):
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
+        touch(s3, 'foo.txt', 'bar')
+        touch(s3, 'bar.txt', 'baz')
+        touch(s3, 'baz/foo.txt', 'foo')
+
+        batches = list(s3.list_batch())
+        assert [['baz/', 'bar.txt', 'foo.txt']] == batches
+        assert batches[0] == list(s3.list())
+
+        batches = list(s3.list_batch(recursive=True))
+        assert [['bar.txt', 'baz/foo.txt', 'foo.txt']] == batches
+        assert batches[0] == list(s3.list(recursive=True))
+
+        assert ['baz/', 'bar.txt', 'foo.txt'] == \
+            [st.filename for st in s3.list(detail=True)]
+
+
+def test_prefetch_pages():
+    assert list(range(10)) == list(_prefetch_pages(iter(range(10))))
+
+    # Closing early stops the producer thread without waiting for
+    # the in-flight page
+    before = set(threading.enumerate())
+    release = threading.Event()
+
+    def slow():
+        yield 0
+        release.wait()
+        yield 1
+
+    pages = _prefetch_pages(slow())
+    assert 0 == next(pages)
+    pages.close()
+    release.set()
+    for t in set(threading.enumerate()) - before:
+        t.join(timeout=5)
+        assert not t.is_alive()
+
+    def failing():
+        yield 0
+        raise ValueError('page')
+
+    pages = _prefetch_pages(failing())
+    assert 0 == next(pages)
+    with pytest.raises(ValueError):
+        next(pages)
+
+
 def _seek_check(f):
     # Seek by absolute position
     ###########################
@@ -366,6 +578,233 @@ third line
         assert 233458 == f._CHUNK_SIZE
 
 
+def test_s3_readinto(s3_fixture):
+    data = bytes(range(256)) * 100
+    with from_url('s3://test-bucket/base', buffering=0,
+                  **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.data', 'wb') as fp:
+            fp.write(data)
+
+        with s3.open('foo.data', 'rb') as fp:
+            buf = bytearray(1000)
+            assert 1000 == fp.readinto(buf)
+            assert data[:1000] == buf
+
+            view = memoryview(buf)[100:300]
+            assert 200 == fp.readinto(view)
+            assert data[1000:1200] == buf[100:300]
+            assert 1200 == fp.tell()
+
+            fp.seek(len(data) - 10)
+            assert 10 == fp.readinto(buf)
+            assert data[-10:] == buf[:10]
+            assert 0 == fp.readinto(buf)
+
+
+@pytest.mark.parametrize("buffering", [-1, 0])
+def test_s3_parallel_read(s3_fixture, monkeypatch, buffering):
+    monkeypatch.setattr('pfio.v2.s3.PARALLEL_READ_CHUNKSIZE', 1000)
+    data = bytes(range(256)) * 100
+    with from_url('s3://test-bucket/base', buffering=buffering,
+                  **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.data', 'wb') as fp:
+            fp.write(data)
+
+        calls = []
+        get_object = s3.client.get_object
+
+        def counting_get_object(**kwargs):
+            calls.append(kwargs['Range'])
+            return get_object(**kwargs)
+
+        monkeypatch.setattr(s3.client, 'get_object', counting_get_object)
+
+        with s3.open('foo.data', 'rb') as fp:
+            assert data == fp.read()
+        assert 26 == len(calls)
+
+        with s3.open('foo.data', 'rb') as fp:
+            assert data[:1500] == fp.read(1500)
+            fp.seek(100)
+            buf = bytearray(5000)
+            assert 5000 == fp.readinto(buf)
+            assert data[100:5100] == buf
+            assert data[5100:] == fp.read()
+
+
+def _count_head_object(s3, monkeypatch):
+    calls = []
+    head_object = s3.client.head_object
+
+    def counting_head_object(**kwargs):
+        calls.append(kwargs['Key'])
+        return head_object(**kwargs)
+
+    monkeypatch.setattr(s3.client, 'head_object', counting_head_object)
+    return calls
+
+
+def test_s3_head_cache(s3_fixture, monkeypatch):
+    with from_url('s3://test-bucket/base', head_cache_ttl=2.0,
+                  **s3_fixture.aws_kwargs) as s3:
+        calls = _count_head_object(s3, monkeypatch)
+
+        touch(s3, 'foo.data', '0123456789')
+        assert s3.exists('foo.data')
+        assert 10 == s3.stat('foo.data').size
+        with s3.open('foo.data', 'rb') as fp:
+            assert b'0123456789' == fp.read()
+        assert ['base/foo.data'] == calls
+
+        # Writes through the same instance invalidate the cache
+        touch(s3, 'foo.data', '01234')
+        assert 5 == s3.stat('foo.data').size
+        s3.remove('foo.data')
+        assert not s3.exists('foo.data')
+
+        # Least recently used entry is evicted
+        monkeypatch.setattr('pfio.v2.s3.HEAD_CACHE_SIZE', 2)
+        for name in ['a', 'b', 'c']:
+            touch(s3, name, name)
+        s3.stat('a')
+        s3.stat('b')
+        s3.stat('a')
+        s3.stat('c')
+        assert ['base/a', 'base/c'] == list(s3._head_cache)
+
+    # Prefix probes are cached as well
+    with from_url('s3://test-bucket/base', head_cache_ttl=2.0,
+                  **s3_fixture.aws_kwargs) as s3:
+        touch(s3, 'dir/foo', 'bar')
+        probes = []
+        list_objects_v2 = s3.client.list_objects_v2
+
+        def counting_list_objects_v2(**kwargs):
+            probes.append(kwargs['Prefix'])
+            return list_objects_v2(**kwargs)
+
+        monkeypatch.setattr(s3.client, 'list_objects_v2',
+                            counting_list_objects_v2)
+        assert s3.exists('dir')
+        assert s3.isdir('dir')
+        assert s3.stat('dir').isdir()
+        assert not s3.exists('nonexistent')
+        assert not s3.exists('nonexistent')
+        assert ['base/dir', 'base/nonexistent', 'base/nonexistent'] == probes
+
+    # Disabled by default
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
+        touch(s3, 'foo.data', '0123456789')
+        calls = _count_head_object(s3, monkeypatch)
+
+        assert s3.exists('foo.data')
+        assert 10 == s3.stat('foo.data').size
+        assert 2 == len(calls)
+
+
+def test_s3_prefetch(s3_fixture):
+    data = bytes(range(256)) * 100
+    with from_url('s3://test-bucket/base', buffering=0,
+                  **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.data', 'wb') as fp:
+            fp.write(data)
+
+        with s3.open('foo.data', 'rb', prefetch=True) as fp:
+            assert data[:1000] == fp.read(1000)
+            assert fp._next is not None
+            assert 1000 == fp._next[0]
+
+            # Smaller reads are served from the prefetched range
+            assert data[1000:1500] == fp.read(500)
+            assert data[1500:2000] == fp.read(500)
+
+            # Non-contiguous seek drops the prefetched range
+            fp.seek(5000)
+            assert fp._next is None
+            assert data[5000:7000] == fp.read(2000)
+
+            chunks = []
+            while True:
+                chunk = fp.read(3000)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            assert data[7000:] == b''.join(chunks)
+
+        with s3.open('foo.data', 'rb', prefetch=True) as fp:
+            assert data == fp.read()
+
+        # Reads larger than the prefetched range are not short
+        with s3.open('foo.data', 'rb', prefetch=True) as fp:
+            assert data[:1000] == fp.read(1000)
+            assert data[1000:4000] == fp.read(3000)
+            assert data[4000:] == fp.read()
+            assert fp._next is None
+
+        with s3.open('foo.data', 'rb', prefetch=True) as fp:
+            assert data[:10] == fp.read(10)
+            assert data[10:] == fp.readall()
+
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
+        with s3.open('foo.data', 'rb', prefetch=True) as fp:
+            assert data[:10] == fp.read(10)
+            assert data[10:] == fp.read()
+
+        text = 'abcdefghij' * 10000
+        with s3.open('foo.txt', 'w') as fp:
+            fp.write(text)
+        with s3.open('foo.txt', 'r', prefetch=True) as fp:
+            assert text[:5] == fp.read(5)
+            assert text[5:] == fp.read()
+
+
+@pytest.mark.parametrize("key", ['foo', 'dir/foo', '/dir/foo', '//foo',
+                                 'dir/', 'dir//foo', './foo', 'dir/./foo',
+                                 'dir/../foo', '../foo', '.foo', 'dir/.foo',
+                                 '', '.', '/', 'dir/foo/..'])
+def test_normalize_key(key):
+    expected = os.path.normpath(key)
+    if expected.startswith('/'):
+        expected = expected[1:]
+    assert expected == _normalize_key(key)
+
+
+@pytest.mark.parametrize("prefix", ['', '/', 'base', 'base/', '/base/sub'])
+def test_s3_fast_key(s3_fixture, prefix):
+    paths = ['foo', 'dir/foo', '/foo', 'foo/', 'dir//foo', './foo',
+             'dir/../foo', '.foo', 'dir/.foo', '', '.', '..']
+    with from_url('s3://test-bucket/', **s3_fixture.aws_kwargs) as s3:
+        s3.cwd = prefix
+        for path in paths:
+            expected = _normalize_key(os.path.join(prefix, path))
+            assert expected == s3._fast_key(path)
+
+        sub = s3.subfs('sub')
+        assert _normalize_key(os.path.join(prefix, 'sub', 'foo')) \
+            == sub._fast_key('foo')
+
+
+def test_s3_exists_stat_many(s3_fixture):
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
+        names = ['foo-{}'.format(i) for i in range(20)]
+        for i, name in enumerate(names):
+            touch(s3, name, 'x' * i)
+        touch(s3, 'dir/bar', 'bar')
+
+        paths = names + ['nonexistent', 'dir']
+        expected = [True] * len(names) + [False, True]
+        assert expected == s3.exists_many(paths)
+        assert [] == s3.exists_many([])
+
+        stats = s3.stat_many(names)
+        assert list(range(20)) == [st.size for st in stats]
+        assert ['base/' + name for name in names] == \
+            [st.filename for st in stats]
+
+        with pytest.raises(FileNotFoundError):
+            s3.stat_many(names + ['nonexistent'])
+
+
 def test_remove(s3_fixture):
     with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
         with pytest.raises(FileNotFoundError) as err:
@@ -378,6 +817,57 @@ def test_remove(s3_fixture):
         assert not s3.exists('foo.data')
 
 
+def test_remove_recursive(s3_fixture, monkeypatch):
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3:
+        with pytest.raises(FileNotFoundError):
+            s3.remove('non-existent-dir', recursive=True)
+
+        for i in range(1005):
+            touch(s3, 'dir/{}/{}.data'.format(i % 3, i), 'foo')
+        touch(s3, 'dir2/foo.data', 'foo')
+        touch(s3, 'bar.data', 'bar')
+
+        calls = []
+        orig = s3.client.delete_objects
+
+        def delete_objects(**kwargs):
+            calls.append(len(kwargs['Delete']['Objects']))
+            return orig(**kwargs)
+
+        monkeypatch.setattr(s3.client, 'delete_objects', delete_objects)
+        s3.remove('dir', recursive=True)
+        assert sorted(calls) == [5, 1000]
+        assert not s3.isdir('dir')
+        assert not s3.exists('dir/0/0.data')
+        assert s3.exists('dir2/foo.data')
+
+        # A file is removed as is
+        s3.remove('bar.data', recursive=True)
+        assert not s3.exists('bar.data')
+
+
+def test_upload_download_file(s3_fixture):
+    with from_url('s3://test-bucket/base', **s3_fixture.aws_kwargs) as s3, \
+            tempfile.TemporaryDirectory() as d:
+        src = os.path.join(d, 'src.data')
+        dst = os.path.join(d, 'dst.data')
+        data = os.urandom(1024 * 1024)
+        with open(src, 'wb') as f:
+            f.write(data)
+
+        s3.upload_file(src, 'dir/foo.data')
+        assert s3.stat('dir/foo.data').size == len(data)
+        with s3.open('dir/foo.data', 'rb') as f:
+            assert f.read() == data
+
+        s3.download_file('dir/foo.data', dst)
+        with open(dst, 'rb') as f:
+            assert f.read() == data
+
+        with pytest.raises(FileNotFoundError):
+            s3.download_file('non-existent-object', dst)
+
+
 def test_fs_factory(s3_fixture):
     with s3_fixture.fs as s3:
         with s3.open('boom/baz.txt', 'w') as fp:
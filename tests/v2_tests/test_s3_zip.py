@@ -51,6 +51,37 @@ def test_s3_zip():
                 assert zft.content('file') == fp.read()
 
 
+@mock_aws
+def test_s3_zip_open_requests(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        zipfilename = os.path.join(d, "test.zip")
+        zft = ZipForTest(zipfilename)
+        bucket = "test-dummy-bucket"
+
+        with from_url('s3://{}/'.format(bucket),
+                      create_bucket=True) as s3:
+            with open(zipfilename, 'rb') as src, \
+                    s3.open('test.zip', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+
+            ranges = []
+            get_object = s3.client.get_object
+
+            def counting_get_object(**kwargs):
+                ranges.append(kwargs['Range'])
+                return get_object(**kwargs)
+
+            monkeypatch.setattr(s3.client, 'get_object', counting_get_object)
+
+            # The whole central directory comes with the prefetched tail
+            with s3.open_zip('test.zip') as z:
+                assert len(ranges) == 1
+                assert sorted(z.list()) == ['dir', 'file']
+                with z.open('file', 'rb') as fp:
+                    assert zft.content('file') == fp.read()
+                assert z.zipobj.filename == getattr(z.fileobj, 'name', None)
+
+
 @pytest.mark.parametrize("mp_start_method", ["fork", "forkserver"])
 def test_s3_zip_mp(mp_start_method):
     # mock_aws doesn't work well in forkserver, thus we use server-mode moto
@@ -83,7 +114,7 @@ def test_s3_zip_mp(mp_start_method):
         bucket = "test-dummy-bucket"
 
         mp_ctx = multiprocessing.get_context(mp_start_method)
-        q = mp_ctx.Queue()
+        q = mp_ctx.SimpleQueue()
 
         # Copy ZIP
         with from_url('s3://{}/'.format(bucket),
@@ -125,6 +125,24 @@ class TestZip(unittest.TestCase):
             with z.open(self.zipped_file_path, "rb") as zipped_file:
                 self.assertEqual(self.test_string_b, zipped_file.read())
 
+    def test_read_many(self):
+        zip_path = os.path.join(self.tmpdir.name, "many.zip")
+        contents = {"dir/{}".format(i): make_random_str(1000 + i).encode()
+                    for i in range(50)}
+        with ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in contents.items():
+                zf.writestr(name, data)
+
+        with local.open_zip(zip_path) as z:
+            names = sorted(contents, reverse=True)
+            self.assertEqual([contents[name] for name in names],
+                             z.read_many(names))
+            self.assertEqual([contents["dir/0"]], z.read_many(["dir/0"]))
+            self.assertEqual([], z.read_many([]))
+
+            with self.assertRaises(KeyError):
+                z.read_many(["dir/0", "does_not_exist"])
+
     def test_read_string(self):
         with local.open_zip(os.path.abspath(self.zip_file_path)) as z:
             with z.open(self.zipped_file_path, "r") as zipped_file:
@@ -408,6 +426,16 @@ class TestZip(unittest.TestCase):
             self.assertEqual(z.exists(path_or_prefix),
                              expected)
 
+    def test_name_cache(self):
+        with local.open_zip(self.zip_file_path) as z:
+            self.assertEqual(z.dir_cache, {self.dir_name1, self.dir_name2})
+            self.assertIn(os.path.join(self.dir_name2, self.zipped_file_name),
+                          z.name_cache)
+
+            z2 = pickle.loads(pickle.dumps(z))
+            self.assertIsNone(z2.name_cache)
+            self.assertIsNone(z2.dir_cache)
+
     @parameterized.expand(NON_EXIST_LIST)
     def test_not_exists(self, non_exist_file):
         with local.open_zip(self.zip_file_path) as z:
@@ -586,6 +614,24 @@ class TestZipWithLargeData(unittest.TestCase):
         self.tmpdir.cleanup()
         local.remove(self.zip_file_path)
 
+    def test_reset_after_fork(self):
+        with local.open_zip(
+                os.path.abspath(self.zip_file_path)) as z:
+            zipobj = z.zipobj
+            fileobj = z.fileobj
+
+            # Pretend to be a forked child
+            z.pid = -1
+            with z.open(self.testfile_name) as f:
+                self.assertEqual(self.test_string, f.read())
+
+            # The file is opened again but not parsed again
+            self.assertIsNot(fileobj, z.fileobj)
+            self.assertIsNot(zipobj, z.zipobj)
+            self.assertIs(zipobj.filelist, z.zipobj.filelist)
+            self.assertIs(z.fileobj, z.zipobj.fp)
+            fileobj.close()
+
     def test_read_multi_processes(self):
         barrier = multiprocessing.Barrier(2)
         with local.open_zip(